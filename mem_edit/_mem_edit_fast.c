@@ -0,0 +1,361 @@
+/*
+ * Optional C helpers for mem_edit on Linux.
+ *
+ *   scan_region(fd, start, stop, needle, chunk_size=4 MiB) -> List[int]
+ *     Read [start, stop) from a /proc/[pid]/mem file descriptor in chunks and
+ *     return the addresses of every (possibly overlapping) occurrence of needle.
+ *
+ *   parse_maps(fd, writeable_only, skip_substrings=()) -> List[Tuple[int, int, bytes]]
+ *     Read an entire /proc/[pid]/maps file descriptor and return
+ *     (start, stop, path) for each readable (and optionally writeable) mapping
+ *     whose path contains none of skip_substrings.
+ */
+#define _GNU_SOURCE
+#define _FILE_OFFSET_BITS 64
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <errno.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+
+#define DEFAULT_CHUNK_SIZE (4 * 1024 * 1024)
+#define MAPS_INITIAL_SIZE (64 * 1024)
+
+
+static int
+append_hit(unsigned long long **hits, size_t *n_hits, size_t *cap, unsigned long long addr)
+{
+    if (*n_hits == *cap) {
+        size_t new_cap = *cap ? *cap * 2 : 64;
+        unsigned long long *new_hits = realloc(*hits, new_cap * sizeof(**hits));
+        if (new_hits == NULL) {
+            return -1;
+        }
+        *hits = new_hits;
+        *cap = new_cap;
+    }
+    (*hits)[(*n_hits)++] = addr;
+    return 0;
+}
+
+
+static PyObject *
+scan_region(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *kwlist[] = {"fd", "start", "stop", "needle", "chunk_size", NULL};
+    int fd;
+    unsigned long long start, stop;
+    Py_buffer needle;
+    Py_ssize_t chunk_size = DEFAULT_CHUNK_SIZE;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "iKKy*|n:scan_region", kwlist,
+                                     &fd, &start, &stop, &needle, &chunk_size)) {
+        return NULL;
+    }
+    if (needle.len == 0) {
+        PyBuffer_Release(&needle);
+        PyErr_SetString(PyExc_ValueError, "needle must not be empty");
+        return NULL;
+    }
+    if (chunk_size <= 0) {
+        PyBuffer_Release(&needle);
+        PyErr_SetString(PyExc_ValueError, "chunk_size must be positive");
+        return NULL;
+    }
+
+    /* The last (len(needle) - 1) bytes of each chunk are carried over to the
+     * start of the buffer, so matches which span two chunks are still found. */
+    size_t keep_max = (size_t)needle.len - 1;
+    char *buf = malloc((size_t)chunk_size + keep_max);
+    if (buf == NULL) {
+        PyBuffer_Release(&needle);
+        return PyErr_NoMemory();
+    }
+
+    unsigned long long *hits = NULL;
+    size_t n_hits = 0, cap = 0;
+    int err = 0, nomem = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    unsigned long long pos = start;
+    size_t carry = 0;
+    while (pos < stop) {
+        size_t want = (size_t)chunk_size;
+        if (stop - pos < want) {
+            want = (size_t)(stop - pos);
+        }
+        ssize_t n = pread(fd, buf + carry, want, (off_t)pos);
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            err = errno;
+            break;
+        }
+        if (n == 0) {
+            break;
+        }
+
+        size_t avail = carry + (size_t)n;
+        unsigned long long buf_addr = pos - carry;
+        const char *p = buf;
+        const char *end = buf + avail;
+        const char *hit;
+        while (p < end && (hit = memmem(p, (size_t)(end - p), needle.buf, (size_t)needle.len)) != NULL) {
+            if (append_hit(&hits, &n_hits, &cap, buf_addr + (unsigned long long)(hit - buf)) < 0) {
+                nomem = 1;
+                break;
+            }
+            p = hit + 1;
+        }
+        if (nomem) {
+            break;
+        }
+
+        pos += (unsigned long long)n;
+        carry = avail < keep_max ? avail : keep_max;
+        memmove(buf, end - carry, carry);
+    }
+    Py_END_ALLOW_THREADS
+
+    free(buf);
+    PyBuffer_Release(&needle);
+
+    if (nomem) {
+        free(hits);
+        return PyErr_NoMemory();
+    }
+    if (err) {
+        free(hits);
+        errno = err;
+        return PyErr_SetFromErrno(PyExc_OSError);
+    }
+
+    PyObject *result = PyList_New((Py_ssize_t)n_hits);
+    if (result == NULL) {
+        free(hits);
+        return NULL;
+    }
+    for (size_t i = 0; i < n_hits; i++) {
+        PyObject *addr = PyLong_FromUnsignedLongLong(hits[i]);
+        if (addr == NULL) {
+            Py_DECREF(result);
+            free(hits);
+            return NULL;
+        }
+        PyList_SET_ITEM(result, (Py_ssize_t)i, addr);
+    }
+    free(hits);
+    return result;
+}
+
+
+/* Read all of fd into a NUL-terminated heap buffer. Returns NULL and sets *err on failure. */
+static char *
+read_all(int fd, size_t *size_out, int *err)
+{
+    size_t cap = MAPS_INITIAL_SIZE;
+    size_t size = 0;
+    char *buf = malloc(cap + 1);
+    if (buf == NULL) {
+        *err = ENOMEM;
+        return NULL;
+    }
+    for (;;) {
+        if (size == cap) {
+            char *new_buf = realloc(buf, cap * 2 + 1);
+            if (new_buf == NULL) {
+                free(buf);
+                *err = ENOMEM;
+                return NULL;
+            }
+            buf = new_buf;
+            cap *= 2;
+        }
+        ssize_t n = read(fd, buf + size, cap - size);
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            *err = errno;
+            free(buf);
+            return NULL;
+        }
+        if (n == 0) {
+            break;
+        }
+        size += (size_t)n;
+    }
+    buf[size] = '\0';
+    *size_out = size;
+    return buf;
+}
+
+
+/* Advance past one run of non-space characters followed by one or more spaces. */
+static const char *
+skip_field(const char *p, const char *eol)
+{
+    while (p < eol && *p != ' ') {
+        p++;
+    }
+    if (p == eol) {
+        return NULL;
+    }
+    while (p < eol && *p == ' ') {
+        p++;
+    }
+    return p;
+}
+
+
+static PyObject *
+parse_maps(PyObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *kwlist[] = {"fd", "writeable_only", "skip_substrings", NULL};
+    int fd;
+    int writeable_only;
+    PyObject *skip_obj = NULL;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ip|O:parse_maps", kwlist,
+                                     &fd, &writeable_only, &skip_obj)) {
+        return NULL;
+    }
+
+    PyObject *skip;
+    if (skip_obj == NULL) {
+        skip = PyTuple_New(0);
+    } else {
+        skip = PySequence_Fast(skip_obj, "skip_substrings must be a sequence of bytes");
+    }
+    if (skip == NULL) {
+        return NULL;
+    }
+    Py_ssize_t n_skip = PySequence_Fast_GET_SIZE(skip);
+    for (Py_ssize_t i = 0; i < n_skip; i++) {
+        if (!PyBytes_Check(PySequence_Fast_GET_ITEM(skip, i))) {
+            Py_DECREF(skip);
+            PyErr_SetString(PyExc_TypeError, "skip_substrings must be a sequence of bytes");
+            return NULL;
+        }
+    }
+
+    size_t size = 0;
+    int err = 0;
+    char *buf;
+    Py_BEGIN_ALLOW_THREADS
+    buf = read_all(fd, &size, &err);
+    Py_END_ALLOW_THREADS
+    if (buf == NULL) {
+        Py_DECREF(skip);
+        if (err == ENOMEM) {
+            return PyErr_NoMemory();
+        }
+        errno = err;
+        return PyErr_SetFromErrno(PyExc_OSError);
+    }
+
+    PyObject *result = PyList_New(0);
+    if (result == NULL) {
+        goto fail;
+    }
+
+    /* Each line is: start-stop perms offset dev inode [path] */
+    const char *end = buf + size;
+    const char *line = buf;
+    while (line < end) {
+        const char *eol = memchr(line, '\n', (size_t)(end - line));
+        if (eol == NULL) {
+            eol = end;
+        }
+        const char *next = eol + 1;
+
+        char *p;
+        unsigned long long start = strtoull(line, &p, 16);
+        if (p == line || p >= eol || *p != '-') {
+            line = next;
+            continue;
+        }
+        const char *q = p + 1;
+        unsigned long long stop = strtoull(q, &p, 16);
+        if (p == q || eol - p < 6 || *p != ' ') {
+            line = next;
+            continue;
+        }
+        const char *perms = p + 1;
+        if (perms[0] != 'r' || (writeable_only && perms[1] != 'w') || perms[4] != ' ') {
+            line = next;
+            continue;
+        }
+
+        const char *path = perms + 5;
+        for (int field = 0; field < 3 && path != NULL; field++) {
+            path = skip_field(path, eol);
+        }
+        if (path == NULL) {
+            path = eol;
+        }
+        size_t path_len = (size_t)(eol - path);
+
+        int skipped = 0;
+        for (Py_ssize_t i = 0; i < n_skip; i++) {
+            PyObject *sub = PySequence_Fast_GET_ITEM(skip, i);
+            if (memmem(path, path_len, PyBytes_AS_STRING(sub), (size_t)PyBytes_GET_SIZE(sub)) != NULL) {
+                skipped = 1;
+                break;
+            }
+        }
+        if (!skipped) {
+            PyObject *entry = Py_BuildValue("(KKy#)", start, stop, path, (Py_ssize_t)path_len);
+            if (entry == NULL || PyList_Append(result, entry) < 0) {
+                Py_XDECREF(entry);
+                goto fail;
+            }
+            Py_DECREF(entry);
+        }
+        line = next;
+    }
+
+    free(buf);
+    Py_DECREF(skip);
+    return result;
+
+fail:
+    Py_XDECREF(result);
+    free(buf);
+    Py_DECREF(skip);
+    return NULL;
+}
+
+
+static PyMethodDef methods[] = {
+    {"scan_region", (PyCFunction)(void (*)(void))scan_region, METH_VARARGS | METH_KEYWORDS,
+     "scan_region(fd, start, stop, needle, chunk_size=4194304) -> list\n\n"
+     "Read [start, stop) from the file descriptor fd (e.g. /proc/[pid]/mem) and return\n"
+     "the addresses of all occurrences of the bytes-like object needle."},
+    {"parse_maps", (PyCFunction)(void (*)(void))parse_maps, METH_VARARGS | METH_KEYWORDS,
+     "parse_maps(fd, writeable_only, skip_substrings=()) -> list\n\n"
+     "Read all of fd (a /proc/[pid]/maps file) and return (start, stop, path) for every\n"
+     "readable (and, if writeable_only, writeable) mapping whose path contains none of\n"
+     "the bytes in skip_substrings."},
+    {NULL, NULL, 0, NULL}
+};
+
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT,
+    "_mem_edit_fast",
+    "Optional C helpers for mem_edit on Linux.",
+    -1,
+    methods
+};
+
+
+PyMODINIT_FUNC
+PyInit__mem_edit_fast(void)
+{
+    return PyModule_Create(&module);
+}
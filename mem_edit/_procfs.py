@@ -0,0 +1,282 @@
+"""
+Helpers for reading procfs files, and a Process base class with the procfs-based methods
+  shared by the Linux Process implementations.
+"""
+
+from typing import List, Optional, Tuple, Generator
+import errno
+import fnmatch
+import logging
+import os
+import re
+import select
+
+from .abstract import Process as AbstractProcess
+from .utils import MemEditError
+
+try:
+    from ._mem_edit_fast import parse_maps
+except ImportError:
+    parse_maps = None
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (ValueError, OSError):
+    IOV_MAX = -1
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+
+# Permission characters (bytes items are ints), checked by the pure-python maps parser
+_PERM_R = ord('r')
+_PERM_W = ord('w')
+
+# Mappings whose path contains any of these are always skipped by list_mapped_regions.
+#  Set MEM_EDIT_SKIP_MAPS to an os.pathsep-separated list of substrings to override.
+if 'MEM_EDIT_SKIP_MAPS' in os.environ:
+    BLACKLIST_SUBSTR = tuple(os.fsencode(x) for x in os.environ['MEM_EDIT_SKIP_MAPS'].split(os.pathsep) if x)
+else:
+    BLACKLIST_SUBSTR = (b'/dev/dri/', b'Proton')
+
+
+def read_proc_file(path: str, dir_fd: Optional[int] = None) -> bytearray:
+    """
+    Read the entire contents of a (procfs) file without going through Python's text I/O.
+      `dir_fd` is passed to `os.open`.
+    """
+    data = bytearray()
+    fd = os.open(path, os.O_RDONLY, dir_fd=dir_fd)
+    try:
+        while True:
+            chunk = os.read(fd, 1 << 20)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        os.close(fd)
+    return data
+
+
+def read_proc_file_into(path: str, buffer: bytearray, dir_fd: Optional[int] = None) -> int:
+    """
+    Read the entire contents of a (procfs) file into `buffer`, growing it if necessary.
+      Reading in as few calls as possible gives the most consistent view of files like
+      /proc/[pid]/maps, which the kernel generates as they are read.
+      `dir_fd` is passed to `os.open`.
+
+    Returns:
+        Number of bytes read into the start of `buffer`.
+    """
+    size = 0
+    fd = os.open(path, os.O_RDONLY, dir_fd=dir_fd)
+    try:
+        while True:
+            if size == len(buffer):
+                buffer.extend(bytes(max(len(buffer), 1 << 12)))
+            with memoryview(buffer) as view:
+                count = os.readv(fd, [view[size:]])
+            if not count:
+                break
+            size += count
+    finally:
+        os.close(fd)
+    return size
+
+
+def require_proc_fd(proc_fd: Optional[int]) -> int:
+    """
+    Return `proc_fd` (a /proc/[pid] directory fd, or a file opened from it), raising
+      `MemEditError` if the Process has been closed. Passing `dir_fd=None` would instead
+      open files relative to the cwd.
+    """
+    if proc_fd is None:
+        raise MemEditError('Process has been closed')
+    return proc_fd
+
+
+def open_pidfd(pid: int) -> Optional[int]:
+    """
+    Return a pidfd referring to the process `pid`, or `None` if pidfds are not supported
+      (Linux < 5.3 or Python < 3.9).
+    """
+    if not hasattr(os, 'pidfd_open'):
+        return None
+    try:
+        return os.pidfd_open(pid)
+    except OSError as err:
+        if err.errno == errno.ENOSYS:
+            return None
+        raise
+
+
+def pidfd_exited(pidfd: int) -> bool:
+    """
+    Check (without blocking) whether the process referred to by `pidfd` has exited.
+    """
+    poller = select.poll()
+    poller.register(pidfd, select.POLLIN)
+    return bool(poller.poll(0))
+
+
+def find_pid_by_name(target_name: str, pids: List[int]) -> Optional[int]:
+    """
+    Return the first of `pids` whose executable basename is `target_name`, or `None`.
+    """
+    target = os.fsencode(target_name)
+    for pid in pids:
+        try:
+            logger.debug('Checking name for pid {}'.format(pid))
+            # Only argv[0] is needed, so stop reading /proc/[pid]/cmdline at the first NUL;
+            #  that is almost always within the first read, saving the read which returns EOF.
+            cmdline = b''
+            fd = os.open('/proc/{}/cmdline'.format(pid), os.O_RDONLY)
+            try:
+                while True:
+                    chunk = os.read(fd, 1 << 12)
+                    cmdline += chunk
+                    if not chunk or b'\x00' in chunk:
+                        break
+            finally:
+                os.close(fd)
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+
+        name = os.path.basename(cmdline.split(b'\x00', 1)[0])
+        logger.debug('Name was "{}"'.format(os.fsdecode(name)))
+        if name == target:
+            return pid
+
+    logger.info('Found no process with name {}'.format(target_name))
+    return None
+
+
+class ProcfsProcess(AbstractProcess):
+    """
+    Methods shared by the Linux Process implementations, which only need the target's
+      /proc/[pid] directory fd (`_proc_fd`) and, if available, its pidfd (`_pidfd`).
+    """
+    _cmdline_path = None
+    _pidfd = None
+    _proc_fd = None
+    # Reusable buffer for reading /proc/[pid]/maps, allocated by the first pure-python parse
+    _maps_buf = None
+
+    def is_alive(self) -> bool:
+        """
+        Check whether the process is still running, without sending it any signals.
+        """
+        if self._pidfd is not None:
+            return not pidfd_exited(self._pidfd)
+        try:
+            stat = read_proc_file('stat', dir_fd=require_proc_fd(self._proc_fd))
+        except (FileNotFoundError, ProcessLookupError):
+            return False
+        return stat[stat.rindex(b')') + 2:][:1] not in (b'Z', b'X')
+
+    def get_path(self) -> str:
+        if self._cmdline_path is None:
+            try:
+                cmdline = read_proc_file('cmdline', dir_fd=require_proc_fd(self._proc_fd))
+                self._cmdline_path = cmdline.decode().split('\x00')[0]
+            except (FileNotFoundError, ProcessLookupError):
+                return ''
+        return self._cmdline_path
+
+    def invalidate_maps(self):
+        """
+        Discard any regions cached by `list_mapped_regions(..., cache_maps=True)`.
+        """
+        self._maps_cache = {}
+
+    def list_mapped_regions(self,
+                            writeable_only: bool = True,
+                            include_paths=[],
+                            cache_maps: bool = False,
+                            ) -> List[Tuple[int, int]]:
+        # With cache_maps=True, reuse the result of a previous cache_maps=True call until
+        #  invalidate_maps() is called. procfs always reports size 0 and a fixed mtime for
+        #  /proc/[pid]/maps, so there is no cheap way to notice changes automatically.
+        key = (writeable_only, tuple(include_paths), tuple(self.blacklist))
+        if cache_maps and key in self._maps_cache:
+            return list(self._maps_cache[key])
+
+        regions = list(self.iter_mapped_regions(writeable_only, include_paths))
+
+        if cache_maps:
+            self._maps_cache[key] = list(regions)
+        return regions
+
+    def iter_mapped_regions(self,
+                            writeable_only: bool = True,
+                            include_paths=[],
+                            ) -> Generator[Tuple[int, int], None, None]:
+        include_res = ([re.compile(x) for x in include_paths] +
+                       [re.compile(re.escape(x)) for x in include_paths])
+        if self.blacklist:
+            blacklist_re = re.compile('|'.join(fnmatch.translate(x) for x in self.blacklist))
+        else:
+            blacklist_re = None
+
+        for start, stop, path in self._iter_maps_entries(writeable_only):
+            if include_res or blacklist_re:
+                path = os.fsdecode(path)
+
+            if include_res:
+                if not any(r.match(path) is not None for r in include_res):
+                    continue
+
+            if blacklist_re:
+                if blacklist_re.match(path) is not None:
+                    continue
+
+            yield (start, stop)
+
+    def _iter_maps_entries(self, writeable_only: bool) -> Generator[Tuple[int, int, bytes], None, None]:
+        """
+        Yield `(start, stop, path)` for each readable (and, if `writeable_only`, writeable)
+          mapping whose path doesn't contain any of `BLACKLIST_SUBSTR`.
+        """
+        if parse_maps is not None:
+            fd = os.open('maps', os.O_RDONLY, dir_fd=require_proc_fd(self._proc_fd))
+            try:
+                entries = parse_maps(fd, writeable_only, BLACKLIST_SUBSTR)
+            finally:
+                os.close(fd)
+            yield from entries
+            return
+
+        # Hold on to the reusable buffer (allocating it on first use) while reading, so that
+        #  a nested call (made before this generator is exhausted) uses a new one instead of
+        #  overwriting it.
+        maps_buf = self._maps_buf if self._maps_buf is not None else bytearray(1 << 20)
+        self._maps_buf = None
+        try:
+            size = read_proc_file_into('maps', maps_buf, dir_fd=require_proc_fd(self._proc_fd))
+            data = bytes(memoryview(maps_buf)[:size])
+        finally:
+            self._maps_buf = maps_buf
+
+        # Usually none of the substrings occur anywhere in the file, so only check
+        #  each path for the ones that do.
+        skip_substrings = [x for x in BLACKLIST_SUBSTR if x in data]
+
+        # Each line is: start-stop perms offset dev inode [path]
+        #  Splitting each line is faster than matching it against a regex.
+        for line in data.split(b'\n'):
+            fields = line.split(None, 5)
+            if len(fields) < 5:
+                continue
+            perms = fields[1]
+            if perms[0] != _PERM_R or (writeable_only and perms[1] != _PERM_W):
+                continue
+            path = fields[5] if len(fields) > 5 else b''
+            if skip_substrings and any(x in path for x in skip_substrings):
+                continue
+
+            # int() parses the bytes directly (no str decode), and is several times
+            #  faster than a pure-python hex parser
+            start, stop = fields[0].split(b'-')
+            yield (int(start, 16), int(stop, 16), path)
@@ -5,6 +5,7 @@ Abstract class for cross-platform memory editing.
 from typing import List, Tuple, Optional, Union, Generator
 from abc import ABCMeta, abstractmethod
 from contextlib import contextmanager
+import array
 import copy
 import ctypes
 import logging
@@ -61,6 +62,7 @@ class Process(metaclass=ABCMeta):
 
     You can also get a list of which regions in memory are mapped (readable):
         `regions = p.list_mapped_regions(writeable_only=False)`
+     (or iterate over `p.iter_mapped_regions(writeable_only=False)` without building a list)
      which can be used along with search_buffer(...) to re-create .search_all_memory(...):
     ```
         found = []
@@ -164,6 +166,26 @@ class Process(metaclass=ABCMeta):
         """
         pass
 
+    def write_memory_batch(self,
+                           base_addresses: List[int],
+                           write_buffers: List[ctypes_buffer_t],
+                           ):
+        """
+        Write each of the given buffers to the corresponding address in the process's
+          address space. Implementations may override this to perform all of the writes
+          with fewer system calls; by default it calls `.write_memory(...)` for each pair.
+
+        Args:
+            base_addresses: List of addresses to write at, in the process's address space.
+            write_buffers: List of `ctypes` objects (see `.write_memory(...)`), the same length
+                as `base_addresses`, which will be written into memory starting at the
+                corresponding address.
+        """
+        if len(base_addresses) != len(write_buffers):
+            raise ValueError('base_addresses and write_buffers must have the same length')
+        for base_address, write_buffer in zip(base_addresses, write_buffers):
+            self.write_memory(base_address, write_buffer)
+
     @abstractmethod
     def read_memory(self, base_address: int, read_buffer: ctypes_buffer_t) -> ctypes_buffer_t:
         """
@@ -180,6 +202,30 @@ class Process(metaclass=ABCMeta):
         """
         pass
 
+    def read_memory_batch(self,
+                          base_addresses: List[int],
+                          read_buffers: List[ctypes_buffer_t],
+                          ) -> List[ctypes_buffer_t]:
+        """
+        Read into each of the given buffers from the corresponding address in the process's
+          address space. Implementations may override this to perform all of the reads
+          with fewer system calls; by default it calls `.read_memory(...)` for each pair.
+
+        Args:
+            base_addresses: List of addresses to read from, in the process's address space.
+            read_buffers: List of `ctypes` objects (see `.read_memory(...)`), the same length as
+                `base_addresses`. Each is overwritten with the contents of the process's memory
+                starting at the corresponding address.
+
+        Returns:
+            `read_buffers` is returned as well as being overwritten.
+        """
+        if len(base_addresses) != len(read_buffers):
+            raise ValueError('base_addresses and read_buffers must have the same length')
+        for base_address, read_buffer in zip(base_addresses, read_buffers):
+            self.read_memory(base_address, read_buffer)
+        return read_buffers
+
     @abstractmethod
     def list_mapped_regions(self, writeable_only=True, include_paths = []) -> List[Tuple[int, int]]:
         """
@@ -196,6 +242,48 @@ class Process(metaclass=ABCMeta):
         """
         pass
 
+    def iter_mapped_regions(self,
+                            writeable_only: bool = True,
+                            include_paths=[],
+                            ) -> Generator[Tuple[int, int], None, None]:
+        """
+        Like `list_mapped_regions(...)`, but yields each `(start_address, stop_address)` in turn
+          instead of building a list. Implementations may override this to avoid materializing
+          the list; by default it iterates over the result of `.list_mapped_regions(...)`.
+
+        Args:
+            writeable_only: If `True`, only return regions which are also writeable.
+                Default `True`.
+
+        Yields:
+            `(start_address, stop_address)` for each accessible memory region.
+        """
+        yield from self.list_mapped_regions(writeable_only, include_paths)
+
+    def list_mapped_regions_soa(self,
+                                writeable_only: bool = True,
+                                include_paths=[],
+                                ) -> Tuple[array.array, array.array]:
+        """
+        Like `list_mapped_regions(...)`, but return the region bounds as two arrays of
+          unsigned 64-bit integers (`starts`, `stops`) instead of a list of tuples.
+          These can be wrapped without copying for vectorized arithmetic on the regions,
+          e.g. `numpy.frombuffer(starts, dtype=numpy.uint64)`.
+
+        Args:
+            writeable_only: If `True`, only return regions which are also writeable.
+                Default `True`.
+
+        Returns:
+            `(starts, stops)`, where `(starts[i], stops[i])` are the bounds of the i-th region.
+        """
+        starts = array.array('Q')
+        stops = array.array('Q')
+        for start, stop in self.iter_mapped_regions(writeable_only, include_paths):
+            starts.append(start)
+            stops.append(stop)
+        return starts, stops
+
     @abstractmethod
     def get_path(self) -> str:
         """
@@ -265,7 +353,8 @@ class Process(metaclass=ABCMeta):
             List of read values corresponding to the provided targets.
         """
         base = self.read_memory(base_address, ctypes.c_void_p()).value
-        values = [self.read_memory(base + offset, buffer) for offset, buffer in targets]
+        values = self.read_memory_batch([base + offset for offset, _ in targets],
+                                        [buffer for _, buffer in targets])
         return values
 
     def search_addresses(self,
@@ -289,18 +378,23 @@ class Process(metaclass=ABCMeta):
             List of addresses where the `needle_buffer` was found.
         """
         found = []
-        read_buffer = copy.copy(needle_buffer)
 
         if verbatim:
             def compare(a, b):
-                return bytes(read_buffer) == bytes(needle_buffer)
+                return bytes(a) == bytes(b)
         else:
             compare = utils.ctypes_equal
 
-        for address in addresses:
-            self.read_memory(address, read_buffer)
-            if compare(needle_buffer, read_buffer):
-                found.append(address)
+        # Read the addresses in batches, so that implementations of read_memory_batch
+        #  can fetch many of them with a single system call.
+        batch_size = 1024
+        read_buffers = [copy.copy(needle_buffer) for _ in range(min(batch_size, len(addresses)))]
+        for i in range(0, len(addresses), batch_size):
+            batch = addresses[i:i + batch_size]
+            batch_buffers = read_buffers[:len(batch)]
+            self.read_memory_batch(batch, batch_buffers)
+            found += [address for address, read_buffer in zip(batch, batch_buffers)
+                      if compare(needle_buffer, read_buffer)]
         return found
 
     def search_all_memory(self,
@@ -329,7 +423,7 @@ class Process(metaclass=ABCMeta):
         else:
             search = utils.search_buffer
 
-        for start, stop in self.list_mapped_regions(writeable_only):
+        for start, stop in self.iter_mapped_regions(writeable_only):
             try:
                 region_buffer = (ctypes.c_byte * (stop - start))()
                 self.read_memory(start, region_buffer)
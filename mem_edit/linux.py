@@ -2,32 +2,42 @@
 Implementation of Process class for Linux
 """
 
-from typing import List, Tuple, Optional
+from typing import List, Optional
 from os import strerror
 import os
 import os.path
-import signal
 import ctypes
 import ctypes.util
+import errno
 import logging
-import re
 
-from .abstract import Process as AbstractProcess
 from .utils import ctypes_buffer_t, MemEditError
-import fnmatch
+from ._procfs import (IOV_MAX, ProcfsProcess, read_proc_file, require_proc_fd,
+                      open_pidfd, pidfd_exited, find_pid_by_name)
+
+try:
+    from ._mem_edit_fast import scan_region
+except ImportError:
+    scan_region = None
 
 logger = logging.getLogger(__name__)
 
 
 ptrace_commands = {
+    'PTRACE_CONT': 7,
     'PTRACE_GETREGS': 12,
     'PTRACE_SETREGS': 13,
     'PTRACE_ATTACH': 16,
     'PTRACE_DETACH': 17,
     'PTRACE_SYSCALL': 24,
     'PTRACE_SEIZE': 16902,
+    'PTRACE_INTERRUPT': 16903,
+    'PTRACE_LISTEN': 16904,
     }
 
+# status >> 16 from waitpid() for a PTRACE_INTERRUPT (or group-) stop of a seized tracee
+PTRACE_EVENT_STOP = 128
+
 
 # import ptrace() from libc
 _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
@@ -45,50 +55,227 @@ def ptrace(command: int, pid: int = 0, arg1: int = 0, arg2: int = 0) -> int:
     if result == -1:
         err_no = ctypes.get_errno()
         if err_no:
+            # The OSError (ProcessLookupError for ESRCH) is kept as __cause__
             raise MemEditError('ptrace({}, {}, {}, {})'.format(command, pid, arg1, arg2) +
-                               ' failed with error {}: {}'.format(err_no, strerror(err_no)))
+                               ' failed with error {}: {}'.format(err_no, strerror(err_no))
+                               ) from OSError(err_no, strerror(err_no))
     return result
 
 
-class Process(AbstractProcess):
+class Process(ProcfsProcess):
     pid = None
     blacklist = []
+    _mem_fd = None
+    _paused = False
+    _parent_pid = None
 
     def __init__(self, process_id: int):
-        ptrace(ptrace_commands['PTRACE_SEIZE'], process_id)
         self.pid = process_id
+        try:
+            self._pidfd = open_pidfd(process_id)
+            # Files opened relative to the /proc/[pid] directory fd fail, rather than referring
+            #  to a different process, if the pid is reused after the target exits.
+            self._proc_fd = os.open('/proc/{}'.format(process_id), os.O_RDONLY | os.O_DIRECTORY)
+            if self._pidfd is not None and pidfd_exited(self._pidfd):
+                raise MemEditError('Process {} exited while being opened'.format(process_id))
+            stat = read_proc_file('stat', dir_fd=self._proc_fd)
+            self._parent_pid = int(stat[stat.rindex(b')') + 2:].split()[1])
+            # Keep /proc/[pid]/mem open for the lifetime of the Process, so that
+            #  each read/write is a single pread/pwrite rather than open+seek+close.
+            self._mem_fd = os.open('mem', os.O_RDWR, dir_fd=self._proc_fd)
+            # Seize last, so that a failure above never leaves the target attached
+            ptrace(ptrace_commands['PTRACE_SEIZE'], process_id)
+        except BaseException:
+            self._close_fds()
+            raise
+        self._maps_cache = {}
 
     @staticmethod
     def set_blacklist(bl: list):
         Process.blacklist = bl
 
     def close(self):
-        os.kill(self.pid, signal.SIGSTOP)
+        if self.pid is None:
+            return
+        # If the target already exited there is nothing to detach from. Otherwise it only
+        #  needs to be in a ptrace-stop; PTRACE_DETACH then resumes it, so unlike
+        #  SIGSTOP/SIGCONT this doesn't disturb any job-control state.
+        try:
+            alive = self.is_alive()
+            if alive:
+                try:
+                    self.pause()
+                    ptrace(ptrace_commands['PTRACE_DETACH'], self.pid, 0, 0)
+                except ChildProcessError:
+                    alive = False
+                except MemEditError as err:
+                    # ESRCH: the target exited before it could be stopped or detached
+                    if not isinstance(err.__cause__, ProcessLookupError):
+                        raise
+                    alive = False
+            if not alive and self._parent_pid != os.getpid():
+                # Reap the traced zombie, so that its exit status goes back to its real parent.
+                #  If that is us, leave the status for our own wait() instead.
+                try:
+                    os.waitpid(self.pid, os.WNOHANG)
+                except ChildProcessError:
+                    pass
+        finally:
+            self._paused = False
+            self._close_fds()
+            self._maps_cache = {}
+            self._cmdline_path = None
+            self.pid = None
+
+    def _close_fds(self):
+        for name in ('_mem_fd', '_proc_fd', '_pidfd'):
+            fd = getattr(self, name, None)
+            if fd is not None:
+                os.close(fd)
+                setattr(self, name, None)
+
+    def pause(self):
+        """
+        Stop the process without detaching from it, e.g. to get a consistent view of its memory.
+          The process stays seized (attached) for the lifetime of this object, so reading and
+          writing memory never requires stopping it; only call this when a stop is needed.
+          While seized, a signal sent to the process stops it until it is passed on by the
+          next call to `pause()`, `resume()` or `close()`.
+        """
+        if self._paused:
+            return
+        ptrace(ptrace_commands['PTRACE_INTERRUPT'], self.pid, 0, 0)
+        while True:
+            _, status = os.waitpid(self.pid, 0)
+            if os.WIFEXITED(status) or os.WIFSIGNALED(status):
+                raise MemEditError('Process {} exited while being paused'.format(self.pid)
+                                   ) from ProcessLookupError(errno.ESRCH, strerror(errno.ESRCH))
+            if not os.WIFSTOPPED(status):
+                continue
+            if status >> 16 == PTRACE_EVENT_STOP:
+                break
+            # A signal arrived before the interrupt took effect. Deliver it, rather than
+            #  dropping it, and keep waiting for the interrupt stop which is still pending.
+            ptrace(ptrace_commands['PTRACE_CONT'], self.pid, 0, os.WSTOPSIG(status))
+        self._paused = True
+
+    def resume(self):
+        """
+        Continue a process previously stopped with `pause()`.
+        """
+        if not self._paused:
+            return
+        ptrace(ptrace_commands['PTRACE_CONT'], self.pid, 0, 0)
+        self._paused = False
+        self._pass_on_signals()
+
+    def _pass_on_signals(self):
+        """
+        Deliver signals which were queued while the process was paused. The interrupt stop is
+          reported before pending signals are dequeued, so once continued the process would
+          otherwise sit in a signal-delivery-stop which nobody waits for.
+        """
+        while True:
+            # Check for pending signals before polling: the kernel dequeues a signal and
+            #  enters the signal-delivery-stop atomically with respect to both.
+            pending = self._has_pending_signals()
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                if not pending:
+                    return
+                os.sched_yield()
+                continue
+            if not os.WIFSTOPPED(status):
+                return
+            if status >> 16 == PTRACE_EVENT_STOP:
+                # Job-control stop (e.g. SIGSTOP): stay stopped until SIGCONT, as if untraced.
+                #  Any other pending signals won't be dequeued until then.
+                ptrace(ptrace_commands['PTRACE_LISTEN'], self.pid, 0, 0)
+                return
+            ptrace(ptrace_commands['PTRACE_CONT'], self.pid, 0, os.WSTOPSIG(status))
+
+    def _has_pending_signals(self) -> bool:
+        """
+        Check whether the process has any pending signals which it doesn't block.
+        """
         try:
-            os.waitpid(self.pid, 0)
-        except ChildProcessError:
-            pass
-        ptrace(ptrace_commands['PTRACE_DETACH'], self.pid, 0, 0)
-        os.kill(self.pid, signal.SIGCONT)
-        self.pid = None
+            status = read_proc_file('status', dir_fd=require_proc_fd(self._proc_fd))
+        except (FileNotFoundError, ProcessLookupError):
+            return False
+        fields = dict(line.split(b':', 1) for line in bytes(status).splitlines() if b':' in line)
+        pending = int(fields[b'SigPnd'], 16) | int(fields[b'ShdPnd'], 16)
+        return bool(pending & ~int(fields[b'SigBlk'], 16))
 
     def write_memory(self, base_address: int, write_buffer: ctypes_buffer_t):
-        with open('/proc/{}/mem'.format(self.pid), 'rb+') as mem:
-            mem.seek(base_address)
-            mem.write(write_buffer)
+        # A short transfer means the rest of the buffer is unmapped in the target
+        size = ctypes.sizeof(write_buffer)
+        if os.pwritev(require_proc_fd(self._mem_fd), [write_buffer], base_address) != size:
+            raise OSError(errno.EIO, os.strerror(errno.EIO))
 
     def read_memory(self, base_address: int, read_buffer: ctypes_buffer_t) -> ctypes_buffer_t:
-        with open('/proc/{}/mem'.format(self.pid), 'rb+') as mem:
-            mem.seek(base_address)
-            mem.readinto(read_buffer)
+        # A short transfer would leave stale bytes at the end of the buffer
+        size = ctypes.sizeof(read_buffer)
+        if os.preadv(require_proc_fd(self._mem_fd), [read_buffer], base_address) != size:
+            raise OSError(errno.EIO, os.strerror(errno.EIO))
         return read_buffer
 
-    def get_path(self) -> str:
-        try:
-            with open('/proc/{}/cmdline', 'rb') as f:
-                return f.read().decode().split('\x00')[0]
-        except FileNotFoundError:
-            return ''
+    def read_memory_batch(self, base_addresses: List[int], read_buffers: List[ctypes_buffer_t]) -> List[ctypes_buffer_t]:
+        self._transfer_batch(os.preadv, base_addresses, read_buffers)
+        return read_buffers
+
+    def write_memory_batch(self, base_addresses: List[int], write_buffers: List[ctypes_buffer_t]):
+        self._transfer_batch(os.pwritev, base_addresses, write_buffers)
+
+    def _transfer_batch(self, function, base_addresses: List[int], buffers: List[ctypes_buffer_t]):
+        if len(base_addresses) != len(buffers):
+            raise ValueError('base_addresses and buffers must have the same length')
+
+        # preadv()/pwritev() take a single offset, so group runs of buffers which are
+        #  contiguous in the target's address space and transfer each run at once.
+        mem_fd = require_proc_fd(self._mem_fd)
+
+        def transfer_group(group, group_start, group_stop):
+            # A partial transfer skips the remaining buffers, so treat it as a failure
+            if function(mem_fd, group, group_start) != group_stop - group_start:
+                raise OSError(errno.EIO, os.strerror(errno.EIO))
+
+        group_start = None
+        group_stop = None
+        group = []
+        for base_address, buffer in zip(base_addresses, buffers):
+            if base_address != group_stop or len(group) >= IOV_MAX:
+                if group:
+                    transfer_group(group, group_start, group_stop)
+                group_start = base_address
+                group_stop = base_address
+                group = []
+            group.append(buffer)
+            group_stop += ctypes.sizeof(buffer)
+        if group:
+            transfer_group(group, group_start, group_stop)
+
+    def search_all_memory(self,
+                          needle_buffer: ctypes_buffer_t,
+                          writeable_only: bool = True,
+                          verbatim: bool = True,
+                          ) -> List[int]:
+        # With the C extension available, verbatim searches are done in chunks directly
+        #  from /proc/[pid]/mem, without allocating a ctypes buffer for each region.
+        if scan_region is None or not verbatim:
+            return super().search_all_memory(needle_buffer, writeable_only, verbatim)
+
+        found = []
+        mem_fd = require_proc_fd(self._mem_fd)
+        needle = bytes(needle_buffer)
+        for start, stop in self.iter_mapped_regions(writeable_only):
+            try:
+                found += scan_region(mem_fd, start, stop, needle)
+            except OSError:
+                logger.error('Failed to read in range  0x{:x} - 0x{:x}'.format(start, stop))
+        return found
 
     @staticmethod
     def list_available_pids() -> List[int]:
@@ -102,52 +289,4 @@ class Process(AbstractProcess):
 
     @staticmethod
     def get_pid_by_name(target_name: str) -> Optional[int]:
-        for pid in Process.list_available_pids():
-            try:
-                logger.debug('Checking name for pid {}'.format(pid))
-                with open('/proc/{}/cmdline'.format(pid), 'rb') as cmdline:
-                    path = cmdline.read().decode().split('\x00')[0]
-            except FileNotFoundError:
-                continue
-
-            name = os.path.basename(path)
-            logger.debug('Name was "{}"'.format(name))
-            if path is not None and name == target_name:
-                return pid
-
-        logger.info('Found no process with name {}'.format(target_name))
-        return None
-
-    def list_mapped_regions(self, writeable_only: bool = True, include_paths=[]) -> List[Tuple[int, int]]:
-        regions = []
-        with open('/proc/{}/maps'.format(self.pid), 'r') as maps:
-            for line in maps:
-                if "/dev/dri/" in line:
-                    continue
-                if "Proton" in line:
-                    continue
-
-                whole = line.split()
-                if len(whole) < 6:
-                    whole.append('')
-                if len(whole) >= 7:
-                    whole[5] = " ".join(whole[5:])
-                if include_paths:
-                    if not any(re.match(x, whole[5]) is not None for x in include_paths) and not any(re.match(re.escape(x), whole[5]) is not None for x in include_paths):
-                        continue
-
-                if self.blacklist:
-                    if any(fnmatch.fnmatch(whole[5], x) for x in self.blacklist):
-                        continue
-
-                bounds, privileges = whole[0:2]
-
-                if 'r' not in privileges:
-                    continue
-
-                if writeable_only and 'w' not in privileges:
-                    continue
-
-                start, stop = (int(bound, 16) for bound in bounds.split('-'))
-                regions.append((start, stop))
-        return regions
+        return find_pid_by_name(target_name, Process.list_available_pids())
@@ -2,20 +2,20 @@
 Implementation of Process class for Linux with kernel >= 3.2
 """
 
-from typing import List, Tuple, Optional
+from typing import List, Optional
 from os import strerror
 import os
 import os.path
 import signal
 import ctypes
 import ctypes.util
+import errno
 import logging
+import mmap
+import time
 
-from .abstract import Process as AbstractProcess
-from .utils import ctypes_buffer_t
-import re
-import fnmatch
-
+from .utils import ctypes_buffer_t, MemEditError
+from ._procfs import IOV_MAX, ProcfsProcess, open_pidfd, pidfd_exited, find_pid_by_name
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +24,7 @@ def _error_checker(result, function, arguments):
     if result == -1:
         errno = ctypes.get_errno()
         raise OSError(errno, os.strerror(errno))
+    return result
 
 class IOBuffer(ctypes.Structure): # iovec struct
     _fields_ = [("base", ctypes.c_void_p),
@@ -44,6 +45,15 @@ _write_process_memory.args = [ctypes.c_ulong, ctypes.POINTER(IOBuffer),
                             ctypes.c_ulong, ctypes.POINTER(IOBuffer),
                             ctypes.c_ulong, ctypes.c_ulong]
 
+PAGE_SIZE = mmap.PAGESIZE
+
+# Unprivileged processes can't map anything below vm.mmap_min_addr
+try:
+    with open('/proc/sys/vm/mmap_min_addr', 'r') as f:
+        MMAP_MIN_ADDR = int(f.read())
+except (OSError, ValueError):
+    MMAP_MIN_ADDR = 0
+
 def read_process_memory(pid: int, base: int, buffer: ctypes_buffer_t) -> ctypes_buffer_t:
     size = ctypes.sizeof(buffer)
     local = IOBuffer(ctypes.addressof(buffer), size)
@@ -58,31 +68,136 @@ def write_process_memory(pid: int, base: int, buffer: ctypes_buffer_t) -> ctypes
     res_size = _write_process_memory(pid, ctypes.byref(local), 1, ctypes.byref(remote), 1, 0)
     return res_size
 
-class Process(AbstractProcess):
+def _transfer_batch(function, pid: int, base_addrs: List[int], buffers: List[ctypes_buffer_t]):
+    """
+    Call `function` (process_vm_readv or process_vm_writev) once for every `IOV_MAX` buffers,
+      pairing each buffer with the corresponding address in `base_addrs`.
+    """
+    if len(base_addrs) != len(buffers):
+        raise ValueError('base_addrs and buffers must have the same length')
+
+    for i in range(0, len(buffers), IOV_MAX):
+        chunk_addrs = base_addrs[i:i + IOV_MAX]
+        chunk_buffers = buffers[i:i + IOV_MAX]
+        n = len(chunk_buffers)
+        local = (IOBuffer * n)()
+        remote = (IOBuffer * n)()
+        total = 0
+        for j, (base, buffer) in enumerate(zip(chunk_addrs, chunk_buffers)):
+            size = ctypes.sizeof(buffer)
+            local[j].base = ctypes.addressof(buffer)
+            local[j].size = size
+            remote[j].base = base
+            remote[j].size = size
+            total += size
+        res_size = function(pid, local, n, remote, n, 0)
+        # A partial transfer skips the remaining buffers, so treat it as a failure
+        if res_size != total:
+            raise OSError(errno.EFAULT, os.strerror(errno.EFAULT))
+
+def read_process_memory_batch(pid: int, base_addrs: List[int], buffers: List[ctypes_buffer_t]) -> List[ctypes_buffer_t]:
+    """
+    Read into each of `buffers` from the corresponding address in `base_addrs`, using a single
+      process_vm_readv() call for every `IOV_MAX` buffers.
+    """
+    _transfer_batch(_read_process_memory, pid, base_addrs, buffers)
+    return buffers
+
+def write_process_memory_batch(pid: int, base_addrs: List[int], buffers: List[ctypes_buffer_t]):
+    """
+    Write each of `buffers` to the corresponding address in `base_addrs`, using a single
+      process_vm_writev() call for every `IOV_MAX` buffers.
+    """
+    _transfer_batch(_write_process_memory, pid, base_addrs, buffers)
+
+class Process(ProcfsProcess):
     pid = None
+    blacklist = []
+
+    # Reads starting below this address fail immediately, without a syscall
+    min_address = MMAP_MIN_ADDR
+
+    # Maximum number of remembered unreadable pages before they are forgotten
+    max_bad_pages = 4096
+
+    # Seconds for which an unreadable page is remembered, since the target
+    #  can map it at any time
+    bad_page_ttl = 1.0
 
     def __init__(self, process_id: int):
         self.pid = process_id
+        try:
+            self._pidfd = open_pidfd(process_id)
+            # Files opened relative to the /proc/[pid] directory fd fail, rather than referring
+            #  to a different process, if the pid is reused after the target exits.
+            self._proc_fd = os.open('/proc/{}'.format(process_id), os.O_RDONLY | os.O_DIRECTORY)
+        except BaseException:
+            self._close_fds()
+            raise
+        if self._pidfd is not None and pidfd_exited(self._pidfd):
+            self._close_fds()
+            raise MemEditError('Process {} exited while being opened'.format(process_id))
+        self._maps_cache = {}
+        self._bad_pages = {}
 
     @staticmethod
     def set_blacklist(bl: list):
         Process.blacklist = bl
 
     def close(self):
+        self._close_fds()
+        self._maps_cache = {}
+        self._bad_pages = {}
+        self._cmdline_path = None
         self.pid = None
 
+    def _close_fds(self):
+        for name in ('_proc_fd', '_pidfd'):
+            fd = getattr(self, name, None)
+            if fd is not None:
+                os.close(fd)
+                setattr(self, name, None)
+
     def write_memory(self, base_address: int, write_buffer: ctypes_buffer_t):
         write_process_memory(self.pid, base_address, write_buffer)
 
+    def _check_bad_page(self, base_address: int, now: float):
+        page = base_address // PAGE_SIZE
+        if base_address < self.min_address:
+            raise OSError(errno.EFAULT, os.strerror(errno.EFAULT))
+        expiry = self._bad_pages.get(page)
+        if expiry is not None:
+            if now < expiry:
+                raise OSError(errno.EFAULT, os.strerror(errno.EFAULT))
+            del self._bad_pages[page]
+
     def read_memory(self, base_address: int, read_buffer: ctypes_buffer_t) -> ctypes_buffer_t:
-        return read_process_memory(self.pid, base_address, read_buffer)
+        # Probing reads often land on unmapped pages; remember pages which recently failed
+        #  so that repeated probes raise without making the syscall again.
+        now = time.monotonic()
+        self._check_bad_page(base_address, now)
 
-    def get_path(self) -> str:
         try:
-            with open('/proc/{}/cmdline', 'rb') as f:
-                return f.read().decode().split('\x00')[0]
-        except FileNotFoundError:
-            return ''
+            return read_process_memory(self.pid, base_address, read_buffer)
+        except OSError as err:
+            page = base_address // PAGE_SIZE
+            stop_page = (base_address + max(ctypes.sizeof(read_buffer), 1) - 1) // PAGE_SIZE
+            if err.errno == errno.EFAULT and stop_page == page:
+                if len(self._bad_pages) >= self.max_bad_pages:
+                    self._bad_pages = {k: v for k, v in self._bad_pages.items() if now < v}
+                    if len(self._bad_pages) >= self.max_bad_pages:
+                        self._bad_pages.clear()
+                self._bad_pages[page] = now + self.bad_page_ttl
+            raise
+
+    def read_memory_batch(self, base_addresses: List[int], read_buffers: List[ctypes_buffer_t]) -> List[ctypes_buffer_t]:
+        now = time.monotonic()
+        for base_address in base_addresses:
+            self._check_bad_page(base_address, now)
+        return read_process_memory_batch(self.pid, base_addresses, read_buffers)
+
+    def write_memory_batch(self, base_addresses: List[int], write_buffers: List[ctypes_buffer_t]):
+        write_process_memory_batch(self.pid, base_addresses, write_buffers)
 
     @staticmethod
     def list_available_pids() -> List[int]:
@@ -96,52 +211,12 @@ class Process(AbstractProcess):
 
     @staticmethod
     def get_pid_by_name(target_name: str) -> Optional[int]:
-        for pid in Process.list_available_pids():
-            try:
-                logger.debug('Checking name for pid {}'.format(pid))
-                with open('/proc/{}/cmdline'.format(pid), 'rb') as cmdline:
-                    path = cmdline.read().decode().split('\x00')[0]
-            except FileNotFoundError:
-                continue
-
-            name = os.path.basename(path)
-            logger.debug('Name was "{}"'.format(name))
-            if path is not None and name == target_name:
-                return pid
-
-        logger.info('Found no process with name {}'.format(target_name))
-        return None
-
-    def list_mapped_regions(self, writeable_only: bool = True, include_paths=[]) -> List[Tuple[int, int]]:
-        regions = []
-        with open('/proc/{}/maps'.format(self.pid), 'r') as maps:
-            for line in maps:
-                if "/dev/dri/" in line:
-                    continue
-                if "Proton" in line:
-                    continue
-
-                whole = line.split()
-                if len(whole) < 6:
-                    whole.append('')
-                if len(whole) >= 7:
-                    whole[5] = " ".join(whole[5:])
-                if include_paths:
-                    if not any(re.match(x, whole[5]) is not None for x in include_paths) and not any(re.match(re.escape(x), whole[5]) is not None for x in include_paths):
-                        continue
-
-                if self.blacklist:
-                    if any(fnmatch.fnmatch(whole[5], x) for x in self.blacklist):
-                        continue
-
-                bounds, privileges = whole[0:2]
-
-                if 'r' not in privileges:
-                    continue
-
-                if writeable_only and 'w' not in privileges:
-                    continue
-
-                start, stop = (int(bound, 16) for bound in bounds.split('-'))
-                regions.append((start, stop))
-        return regions
+        return find_pid_by_name(target_name, Process.list_available_pids())
+
+    def invalidate_maps(self):
+        """
+        Discard any regions cached by `list_mapped_regions(..., cache_maps=True)`, as well
+          as any pages remembered as unreadable by `read_memory(...)`.
+        """
+        super().invalidate_maps()
+        self._bad_pages = {}
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
-from setuptools import setup, find_packages
+import sys
+from setuptools import setup, find_packages, Extension
 
 with open('README.md', 'r') as f:
     long_description = f.read()
@@ -8,6 +9,14 @@ with open('README.md', 'r') as f:
 with open('mem_edit/VERSION', 'r') as f:
     version = f.read().strip()
 
+# Optional C helpers; if they fail to build, the pure-python code paths are used instead.
+ext_modules = []
+if sys.platform.startswith('linux'):
+    ext_modules.append(Extension('mem_edit._mem_edit_fast',
+                                 sources=['mem_edit/_mem_edit_fast.c'],
+                                 extra_compile_args=['-O3'],
+                                 optional=True))
+
 setup(name='mem_edit',
       version=version,
       description='Multi-platform library for memory editing',
@@ -49,6 +58,7 @@ setup(name='mem_edit',
             'Topic :: Utilities',
       ],
       packages=find_packages(),
+      ext_modules=ext_modules,
       package_data={
           'mem_edit': ['VERSION']
       },